@@ -0,0 +1,347 @@
+import argparse
+import contextlib
+import io
+import json
+import mmap
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import refactor_motion
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PHASES = ('walk', 'prefilter', 'decode', 'rewrite', 'write')
+# Differences below this are timer noise, whatever the relative change.
+MIN_REGRESSION_SECONDS = 0.005
+MIN_REGRESSION_KB = 1024
+# A broad migration: most of src/ (and every synthetic file) imports react or
+# @/lib/utils, so nearly the whole tree gets past the prefilter to the tokenizer.
+PARITY_RULES = {'framer-motion': 'motion/react', 'react': 'preact/compat', '@/lib/utils': '@/lib/cn'}
+MATCH_LINE = "import { motion, AnimatePresence } from 'framer-motion';\n"
+FILLER_LINES = (
+    "import { useState } from 'react';\n",
+    "import { cn } from '@/lib/utils';\n",
+    "// Renders the panel body; see docs for motion guidelines.\n",
+    "export function Panel({ title }: { title: string }) {\n",
+    "  const [open, setOpen] = useState(false);\n",
+    '  return <div className={cn("flex items-center gap-2", open && "bg-muted")}>{title}</div>;\n',
+    "}\n",
+)
+
+
+def generate_tree(directory, files, depth, files_per_dir, file_size, match_density, seed):
+    rng = random.Random(seed)
+    leaves = -(-files // files_per_dir)
+    fanout = max(2, round(leaves ** (1 / depth))) if depth else 1
+    filler = ''.join(FILLER_LINES)
+    body = (filler * (file_size // len(filler) + 1))[:max(0, file_size - len(MATCH_LINE))]
+    for i in range(files):
+        parts = []
+        n = i // files_per_dir
+        for _ in range(depth):
+            n, digit = divmod(n, fanout)
+            parts.append(f"dir{digit}")
+        folder = os.path.join(directory, *parts)
+        os.makedirs(folder, exist_ok=True)
+        head = MATCH_LINE if rng.random() < match_density else FILLER_LINES[0]
+        with open(os.path.join(folder, f"Component{i}.tsx"), 'w', encoding='utf-8') as f:
+            f.write(head + body)
+
+
+def copy_fixture(source, directory, match_density, seed):
+    # The real src/ layout, with matching imports injected into a share of its files.
+    shutil.copytree(source, directory)
+    rng = random.Random(seed)
+    for entry in refactor_motion.iter_candidates(directory, gitignore=False):
+        if rng.random() < match_density:
+            with open(entry.path, 'r+', encoding='utf-8') as f:
+                content = f.read()
+                f.seek(0)
+                f.write(MATCH_LINE + content)
+
+
+def snapshot(paths, prefilter=None):
+    originals = {}
+    for path in paths:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        if prefilter is None or prefilter.search(raw):
+            originals[path] = raw
+    return originals
+
+
+def restore(originals):
+    for path, raw in originals.items():
+        with open(path, 'wb') as f:
+            f.write(raw)
+
+
+def run_phases(directory, mapping, pattern):
+    prefilter = refactor_motion.compile_prefilter(mapping)
+    timings = {}
+    volumes = {}
+
+    start = time.perf_counter()
+    paths = [entry.path for entry in refactor_motion.iter_candidates(directory)]
+    timings['walk'] = time.perf_counter() - start
+    volumes['walk'] = (len(paths), 0)
+
+    start = time.perf_counter()
+    hits = []
+    scanned = 0
+    for path in paths:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            scanned += size
+            with (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size >= refactor_motion.MMAP_THRESHOLD
+                  else contextlib.nullcontext(f.read())) as data:
+                if prefilter.search(data):
+                    hits.append((path, bytes(data)))
+    timings['prefilter'] = time.perf_counter() - start
+    volumes['prefilter'] = (len(paths), scanned)
+
+    start = time.perf_counter()
+    decoded = [(path, str(raw, 'utf-8')) for path, raw in hits]
+    timings['decode'] = time.perf_counter() - start
+    volumes['decode'] = (len(hits), sum(len(raw) for _, raw in hits))
+
+    start = time.perf_counter()
+    changed = []
+    for path, content in decoded:
+        new_content = refactor_motion.rewrite(content, mapping, pattern)
+        if new_content != content:
+            changed.append((path, new_content.encode('utf-8')))
+    timings['rewrite'] = time.perf_counter() - start
+    volumes['rewrite'] = (len(decoded), sum(len(content) for _, content in decoded))
+
+    originals = snapshot(path for path, _ in changed)
+    start = time.perf_counter()
+    staged = []
+    for path, raw in changed:
+        st = os.stat(path)
+        staged.append((path, refactor_motion.stage_file(path, raw)[0], st.st_size, st.st_mtime_ns))
+    refactor_motion.commit_staged(staged)
+    timings['write'] = time.perf_counter() - start
+    volumes['write'] = (len(changed), sum(len(raw) for _, raw in changed))
+    restore(originals)
+
+    return timings, volumes
+
+
+def naive_rewrite(content, mapping):
+    # The pre-tokenizer approach: one replace per rule and quote style.
+    for source, target in mapping.items():
+        content = content.replace(f"'{source}'", f"'{target}'").replace(f'"{source}"', f'"{target}"')
+    return content
+
+
+def run_parity(paths, mapping):
+    # Read + prefilter + rewrite through refactor_motion against the naive loop on
+    # the same files. Nothing is written, so the tree needs no restoring.
+    prefilter = refactor_motion.compile_prefilter(mapping)
+    start = time.perf_counter()
+    for path in paths:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        if prefilter.search(raw):
+            refactor_motion.rewrite(str(raw, 'utf-8'), mapping)
+    tokenizer = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            naive_rewrite(f.read(), mapping)
+    naive = time.perf_counter() - start
+    return tokenizer, naive
+
+
+def end_to_end_child(directory, rules_path, mode, jobs):
+    # Runs in a freshly spawned process, so its peak RSS is the codemod's own and
+    # not the harness's tree, snapshots and phase buffers.
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        updated = refactor_motion.refactor_framer_motion(directory, jobs=jobs, rules_path=rules_path, mode=mode)
+    elapsed = time.perf_counter() - start
+    # The --jobs pool has been shut down by now, so RUSAGE_CHILDREN covers its workers.
+    return (elapsed, len(updated), peak_rss_kb(resource.RUSAGE_SELF),
+            peak_rss_kb(resource.RUSAGE_CHILDREN) if jobs > 1 else None)
+
+
+def run_end_to_end(directory, rules_path, mode, jobs):
+    paths = [entry.path for entry in refactor_motion.iter_candidates(directory)]
+    # Only files that can be rewritten need restoring, which keeps 200k-file trees out of memory.
+    prefilter = refactor_motion.compile_prefilter(refactor_motion.load_rules(rules_path))
+    originals = snapshot(paths, prefilter)
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as child:
+        elapsed, updated, rss_kb, workers_rss_kb = child.submit(end_to_end_child, directory, rules_path, mode,
+                                                                jobs).result()
+    restore(originals)
+    return elapsed, len(paths), updated, rss_kb, workers_rss_kb
+
+
+def peak_rss_kb(who):
+    rss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes everywhere else.
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def throughput(seconds, files, nbytes):
+    if seconds <= 0:
+        return {'files_per_s': None, 'mb_per_s': None}
+    return {'files_per_s': round(files / seconds, 1), 'mb_per_s': round(nbytes / seconds / 1e6, 2)}
+
+
+def is_regression(before, current, tolerance, floor=MIN_REGRESSION_SECONDS):
+    return current > before * (1 + tolerance) and current - before > floor
+
+
+def compare(results, baseline, tolerance, rss_tolerance):
+    if baseline['params'] != results['params']:
+        raise SystemExit(f"Baseline was recorded with different parameters: {baseline['params']}")
+
+    regressions = []
+    for name, current in results['phases'].items():
+        before = baseline['phases'].get(name)
+        if before and is_regression(before['seconds'], current['seconds'], tolerance):
+            regressions.append(f"{name}: {before['seconds'] * 1000:.1f} ms -> {current['seconds'] * 1000:.1f} ms")
+    before = baseline.get('end_to_end')
+    current = results['end_to_end']
+    if before and is_regression(before['seconds'], current['seconds'], tolerance):
+        regressions.append(f"end_to_end: {before['seconds'] * 1000:.1f} ms -> {current['seconds'] * 1000:.1f} ms")
+    for name, current in results['peak_rss_kb'].items():
+        before = baseline.get('peak_rss_kb', {}).get(name)
+        if before and current and is_regression(before, current, rss_tolerance, MIN_REGRESSION_KB):
+            regressions.append(f"peak_rss_kb.{name}: {before} KB -> {current} KB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark refactor_motion.py on synthetic or fixture trees.")
+    parser.add_argument('--files', type=int, default=1000, help="synthetic files to generate (default: %(default)s)")
+    parser.add_argument('--depth', type=int, default=3, help="directory nesting depth (default: %(default)s)")
+    parser.add_argument('--files-per-dir', type=int, default=20,
+                        help="synthetic files per leaf directory (default: %(default)s)")
+    parser.add_argument('--file-size', type=int, default=2048, help="bytes per synthetic file (default: %(default)s)")
+    parser.add_argument('--match-density', type=float, default=0.01,
+                        help="share of files containing a matching import (default: %(default)s)")
+    parser.add_argument('--fixture', nargs='?', const=os.path.join(REPO_ROOT, 'src'), metavar='DIR',
+                        help="benchmark a copy of a real tree instead (default: the repo's src/)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measurement; the fastest is kept")
+    parser.add_argument('--jobs', type=int, default=1, help="--jobs passed to the end-to-end run")
+    parser.add_argument('--mode', choices=sorted(refactor_motion.MODES), default='imports')
+    parser.add_argument('--rules', default=refactor_motion.DEFAULT_RULES)
+    parser.add_argument('--parity', action='store_true',
+                        help="also time read+prefilter+rewrite with a broad multi-rule ruleset against a naive "
+                             "per-rule str.replace loop, and fail if it is slower than --parity-tolerance allows; "
+                             "use with --fixture, as synthetic files repeat their imports through the whole body")
+    parser.add_argument('--parity-tolerance', type=float, default=0.25,
+                        help="allowed slowdown against the naive loop (default: %(default)s)")
+    parser.add_argument('--workdir', help="where to build the tree (default: a temporary directory)")
+    parser.add_argument('--keep', action='store_true', help="keep the generated tree")
+    parser.add_argument('--output', metavar='PATH', help="write JSON results here")
+    parser.add_argument('--baseline', metavar='PATH', help="fail if slower or bigger than these stored results")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown against the baseline (default: %(default)s)")
+    parser.add_argument('--rss-tolerance', type=float, default=0.1,
+                        help="allowed peak RSS growth against the baseline (default: %(default)s)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='refactor-motion-bench-')
+    tree = os.path.join(workdir, 'tree')
+    if os.path.exists(tree):
+        shutil.rmtree(tree)
+
+    start = time.perf_counter()
+    if args.fixture:
+        copy_fixture(args.fixture, tree, args.match_density, args.seed)
+    else:
+        os.makedirs(tree)
+        generate_tree(tree, args.files, args.depth, args.files_per_dir, args.file_size, args.match_density, args.seed)
+    print(f"Built tree in {time.perf_counter() - start:.2f}s: {tree}", file=sys.stderr)
+
+    mapping = refactor_motion.load_rules(args.rules)
+    pattern = refactor_motion.MODES[args.mode]
+    try:
+        best = None
+        for _ in range(args.repeat):
+            timings, volumes = run_phases(tree, mapping, pattern)
+            if best is None or sum(timings.values()) < sum(best[0].values()):
+                best = timings, volumes
+        runs = [run_end_to_end(tree, args.rules, args.mode, args.jobs) for _ in range(args.repeat)]
+        end_to_end = min(runs)
+        parity = None
+        if args.parity:
+            paths = [entry.path for entry in refactor_motion.iter_candidates(tree)]
+            runs = [run_parity(paths, PARITY_RULES) for _ in range(args.repeat)]
+            parity = (len(paths), min(tokenizer for tokenizer, _ in runs), min(naive for _, naive in runs))
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir)
+
+    timings, volumes = best
+    results = {
+        'params': {
+            'source': os.path.relpath(args.fixture, REPO_ROOT) if args.fixture else 'synthetic',
+            'files': None if args.fixture else args.files,
+            'depth': None if args.fixture else args.depth,
+            'files_per_dir': None if args.fixture else args.files_per_dir,
+            'file_size': None if args.fixture else args.file_size,
+            'match_density': args.match_density,
+            'seed': args.seed,
+            'mode': args.mode,
+            'jobs': args.jobs,
+        },
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'phases': {name: {'seconds': round(timings[name], 6), 'files': volumes[name][0], 'bytes': volumes[name][1],
+                          **throughput(timings[name], *volumes[name])}
+                   for name in PHASES},
+        'end_to_end': {'seconds': round(end_to_end[0], 6), 'files': end_to_end[1], 'updated': end_to_end[2],
+                       **throughput(end_to_end[0], end_to_end[1], volumes['prefilter'][1])},
+        'parity': parity and {'rules': len(PARITY_RULES), 'files': parity[0], 'seconds': round(parity[1], 6),
+                              'naive_seconds': round(parity[2], 6), 'ratio': round(parity[1] / parity[2], 3)},
+        # Highest across the end-to-end runs; worker processes only exist for --jobs > 1.
+        'peak_rss_kb': {'end_to_end': max(run[3] for run in runs),
+                        'workers': max(run[4] for run in runs) if args.jobs > 1 else None},
+    }
+
+    for name in PHASES + ('end_to_end',):
+        row = results['end_to_end'] if name == 'end_to_end' else results['phases'][name]
+        print(f"{name:>10}: {row['seconds'] * 1000:9.1f} ms  {row['files']:>7} files  "
+              f"{row['files_per_s'] or 0:>10.0f} files/s  {row['mb_per_s'] or 0:>8.1f} MB/s")
+    rss = results['peak_rss_kb']
+    print(f"  peak RSS: {rss['end_to_end']} KB" + (f" (workers {rss['workers']} KB)" if rss['workers'] else ''))
+
+    if parity:
+        row = results['parity']
+        print(f"    parity: {row['seconds'] * 1000:9.1f} ms  vs naive {row['naive_seconds'] * 1000:.1f} ms  "
+              f"({row['ratio']:.2f}x, {row['rules']} rules, {row['files']} files)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+
+    regressions = []
+    if parity and is_regression(parity[2], parity[1], args.parity_tolerance):
+        regressions.append(f"parity: {parity[1] * 1000:.1f} ms against {parity[2] * 1000:.1f} ms for the naive loop")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions += compare(results, json.load(f), args.tolerance, args.rss_tolerance)
+    if regressions:
+        print("REGRESSION:", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
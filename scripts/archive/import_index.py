@@ -0,0 +1,191 @@
+import argparse
+import os
+import posixpath
+import sqlite3
+import sys
+
+from refactor_motion import IMPORT_TOKEN_RE, iter_candidates
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_DB = os.path.join(REPO_ROOT, 'node_modules', '.cache', 'refactor-motion', 'import-index.sqlite')
+INDEX_ROOTS = ('src', 'supabase/functions')
+# Mirrors "paths" in tsconfig.json.
+ALIASES = (('@/', 'src/'),)
+RESOLVE_SUFFIXES = ('', '.ts', '.tsx', '.d.ts', '/index.ts', '/index.tsx')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imports (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    specifier TEXT NOT NULL,
+    resolved TEXT
+);
+CREATE INDEX IF NOT EXISTS imports_file ON imports(file_id);
+CREATE INDEX IF NOT EXISTS imports_specifier ON imports(specifier);
+CREATE INDEX IF NOT EXISTS imports_resolved ON imports(resolved);
+"""
+
+
+def connect(db_path=DEFAULT_DB):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def scan_specifiers(filepath):
+    with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+        content = f.read()
+    specifiers = []
+    for match in IMPORT_TOKEN_RE.finditer(content):
+        specifier = match.group(2)
+        if specifier is not None and specifier not in specifiers:
+            specifiers.append(specifier)
+    return specifiers
+
+
+def resolve(specifier, importer, known):
+    # Returns a repo-relative path for local imports, None for packages/URLs.
+    for alias, target in ALIASES:
+        if specifier.startswith(alias):
+            base = target + specifier[len(alias):]
+            break
+    else:
+        if not specifier.startswith('.'):
+            return None
+        base = posixpath.normpath(posixpath.join(posixpath.dirname(importer), specifier))
+
+    for suffix in RESOLVE_SUFFIXES:
+        if base + suffix in known:
+            return base + suffix
+    return base
+
+
+def update_index(conn, root=REPO_ROOT, roots=INDEX_ROOTS):
+    stored = {path: (file_id, size, mtime_ns)
+              for file_id, path, size, mtime_ns in conn.execute('SELECT id, path, size, mtime_ns FROM files')}
+
+    seen = {}
+    for sub in roots:
+        top = os.path.join(root, sub)
+        if not os.path.isdir(top):
+            continue
+        for entry in iter_candidates(top):
+            st = entry.stat()
+            seen[os.path.relpath(entry.path, root).replace(os.sep, '/')] = (st.st_size, st.st_mtime_ns)
+
+    changed = [path for path, stat in seen.items() if path not in stored or stored[path][1:] != stat]
+    removed = [path for path in stored if path not in seen]
+
+    with conn:
+        conn.executemany('DELETE FROM files WHERE path = ?', ((path,) for path in removed))
+        for path in changed:
+            size, mtime_ns = seen[path]
+            if path in stored:
+                file_id = stored[path][0]
+                conn.execute('UPDATE files SET size = ?, mtime_ns = ? WHERE id = ?', (size, mtime_ns, file_id))
+                conn.execute('DELETE FROM imports WHERE file_id = ?', (file_id,))
+            else:
+                file_id = conn.execute('INSERT INTO files (path, size, mtime_ns) VALUES (?, ?, ?)',
+                                       (path, size, mtime_ns)).lastrowid
+            conn.executemany('INSERT INTO imports (file_id, specifier, resolved) VALUES (?, ?, ?)',
+                             ((file_id, specifier, resolve(specifier, path, seen))
+                              for specifier in scan_specifiers(os.path.join(root, path))))
+
+        # Adding or removing files can change how other files' local imports resolve.
+        if removed or any(path not in stored for path in changed):
+            rows = conn.execute("""
+                SELECT imports.rowid, files.path, imports.specifier
+                FROM imports JOIN files ON files.id = imports.file_id
+                WHERE imports.resolved IS NOT NULL
+            """).fetchall()
+            conn.executemany('UPDATE imports SET resolved = ? WHERE rowid = ?',
+                             ((resolve(specifier, path, seen), rowid) for rowid, path, specifier in rows))
+
+    return len(changed), len(removed)
+
+
+def who_imports(conn, specifier, subpaths=False):
+    query = 'SELECT DISTINCT files.path FROM imports JOIN files ON files.id = imports.file_id WHERE specifier = ?'
+    params = [specifier]
+    if subpaths:
+        # Range scan on the specifier index: every "specifier/..." sorts between "/" and "0".
+        query += ' OR (specifier >= ? AND specifier < ?)'
+        params += [specifier + '/', specifier + '0']
+    return [path for path, in conn.execute(query + ' ORDER BY files.path', params)]
+
+
+def dependents(conn, path):
+    return [importer for importer, in conn.execute("""
+        SELECT DISTINCT files.path FROM imports JOIN files ON files.id = imports.file_id
+        WHERE imports.resolved = ? ORDER BY files.path
+    """, (path,))]
+
+
+def imports_of(conn, path):
+    return conn.execute("""
+        SELECT imports.specifier, imports.resolved FROM imports JOIN files ON files.id = imports.file_id
+        WHERE files.path = ? ORDER BY imports.rowid
+    """, (path,)).fetchall()
+
+
+def files_matching_rules(conn, mapping):
+    # Same matching as refactor_motion.resolve(): exact specifiers, plus subpaths for "from/" rules.
+    paths = set()
+    for source in mapping:
+        if source.endswith('/'):
+            paths.update(path for path, in conn.execute("""
+                SELECT DISTINCT files.path FROM imports JOIN files ON files.id = imports.file_id
+                WHERE specifier >= ? AND specifier < ?
+            """, (source, source[:-1] + '0')))
+        else:
+            paths.update(who_imports(conn, source))
+    return sorted(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index and query module imports under %s." % ', '.join(INDEX_ROOTS))
+    parser.add_argument('--db', default=DEFAULT_DB, help="SQLite index file (default: %(default)s)")
+    parser.add_argument('--root', default=REPO_ROOT, help="repository root (default: %(default)s)")
+    parser.add_argument('--no-update', dest='update', action='store_false',
+                        help="query the index as-is instead of refreshing changed files first")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('update', help="refresh the index for files whose mtime or size changed")
+    who = commands.add_parser('who-imports', help="files importing a module specifier")
+    who.add_argument('specifier')
+    who.add_argument('--subpaths', action='store_true', help="also match specifier/... subpath imports")
+    deps = commands.add_parser('dependents', help="files whose local imports resolve to PATH")
+    deps.add_argument('path')
+    imps = commands.add_parser('imports', help="specifiers imported by PATH")
+    imps.add_argument('path')
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.update or args.command == 'update':
+        changed, removed = update_index(conn, args.root)
+        if args.command == 'update':
+            print(f"Indexed: {changed} changed, {removed} removed")
+            return
+
+    if args.command == 'who-imports':
+        rows = who_imports(conn, args.specifier, args.subpaths)
+    elif args.command == 'dependents':
+        rows = dependents(conn, args.path)
+    else:
+        rows = [f"{specifier}\t{resolved or ''}" for specifier, resolved in imports_of(conn, args.path)]
+    for row in rows:
+        print(row)
+    if not rows:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,851 @@
+import argparse
+import contextlib
+import difflib
+import hashlib
+import json
+import mmap
 import os
-import glob
+import re
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
 
-def refactor_framer_motion(directory):
-    count = 0
-    for root, dirs, files in os.walk(directory):
-        for _file in files:
-            if not _file.endswith(('.tsx', '.ts')):
+DEFAULT_DIRECTORY = '/Users/Naegele/dev/brain/src'
+DEFAULT_RULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'refactor_motion_rules.json')
+CHUNK_SIZE = 64
+MMAP_THRESHOLD = 256 * 1024
+EXTENSIONS = ('.tsx', '.ts')
+DEFAULT_EXCLUDES = ('.git', 'node_modules', 'dist', 'build', 'coverage', 'playwright-report', 'test-results', 'tmp')
+MANIFEST_FORMAT = 1
+REPORT_TOP = 10
+STAGE_SUFFIX = '.refactor-motion.tmp'
+STALE_SUFFIXES = (STAGE_SUFFIX, STAGE_SUFFIX + '.orig')
+FSYNC_WORKERS = 8
+
+# A quoted literal with no quotes, backslashes or newlines inside it. Every
+# literal is looked up in the rule table, so one scan covers all rules.
+SPECIFIER_RE = re.compile(r'([\'"])([^\'"\\\n]*)\1')
+
+# Streaming TS/TSX tokenizer: comments, template literals and ordinary strings
+# are consumed whole, so only module specifiers in import/export/import()/
+# require()/vi.mock()-style positions reach group 2. Every token starts with
+# one of a few characters and the branches then dispatch on it, which lets re
+# skip ahead in C instead of trying each alternative at every offset.
+IMPORT_TOKEN_RE = re.compile(r"""
+    [/`'"fijrv]
+    (?: (?<=/) (?: /[^\n]* | \*.*?\*/ )
+      | (?<=`) [^`\\]*(?:\\.[^`\\]*)*`
+      | (?<=') [^'\\\n]*(?:\\.[^'\\\n]*)*'
+      | (?<=") [^"\\\n]*(?:\\.[^"\\\n]*)*"
+      | (?<!\w.)
+        (?: (?<=f)rom | (?<=i)mport (?:\s*\()? | (?<=r)equire\s*\(
+          | (?: (?<=v)i | (?<=j)est ) \.(?:mock|doMock|unmock|importActual|importMock|requireActual)\s*\(
+        )\s*(['"])([^'"\\\n]*)\1
+    )
+""", re.S | re.X)
+
+MODES = {'imports': IMPORT_TOKEN_RE, 'literals': SPECIFIER_RE}
+
+
+def bracket_to_regex(pattern, i):
+    # "!" or "^" negates only as the first character, a "]" right after that is
+    # literal, and a backslash escapes the next character. Returns None for an
+    # unterminated class, whose "[" is then literal.
+    j = i + 1
+    negated = pattern[j:j + 1] in ('!', '^')
+    if negated:
+        j += 1
+    chars = []
+    while j < len(pattern):
+        c = pattern[j]
+        if c == ']' and chars:
+            # A negated class, like "*" and "?", never matches "/".
+            return '[' + ('^/' if negated else '') + ''.join(chars) + ']', j + 1
+        if c == '\\' and j + 1 < len(pattern):
+            j += 1
+            chars.append(re.escape(pattern[j]))
+        else:
+            chars.append(c if c.isalnum() or c == '-' else '\\' + c)
+        j += 1
+    return None
+
+
+def glob_to_regex(pattern):
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            out.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            out.append('[^/]')
+            i += 1
+        elif pattern[i] == '[':
+            bracket = bracket_to_regex(pattern, i)
+            if bracket is None:
+                out.append(re.escape('['))
+                i += 1
+            else:
+                out.append(bracket[0])
+                i = bracket[1]
+        elif pattern[i] == '\\' and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(out)
+
+
+def parse_gitignore(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+
+    rules = []
+    for line in lines:
+        # Trailing spaces are dropped unless escaped; a leading "\#" or "\!" is
+        # left for glob_to_regex to unescape.
+        stripped = line.rstrip(' ')
+        line = stripped + ' ' if stripped.endswith('\\') and stripped != line else stripped
+        if not line or line.startswith('#'):
+            continue
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            continue
+        # Patterns without an inner slash match at any depth below the .gitignore.
+        regex = glob_to_regex(line.lstrip('/'))
+        if '/' not in line:
+            regex = '(?:.*/)?' + regex
+        rules.append((re.compile(regex), negated, dir_only))
+    return rules
+
+
+def is_ignored(rel, is_dir, rulesets):
+    ignored = False
+    for prefix, strip, rules in rulesets:
+        candidate = prefix + rel[strip:]
+        for regex, negated, dir_only in rules:
+            if dir_only and not is_dir:
                 continue
-            
-            filepath = os.path.join(root, _file)
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-                
-            if 'framer-motion' in content:
-                # Replace importing paths
-                new_content = content.replace('"framer-motion"', '"motion/react"')
-                new_content = new_content.replace("'framer-motion'", "'motion/react'")
-                
-                if new_content != content:
-                    with open(filepath, 'w', encoding='utf-8') as f:
-                        f.write(new_content)
-                    print(f"Updated: {filepath}")
-                    count += 1
-    
-    print(f"Total files updated: {count}")
+            if regex.fullmatch(candidate):
+                ignored = not negated
+    return ignored
+
+
+def ancestor_gitignores(directory):
+    # Collect .gitignore files between the enclosing repo root and directory.
+    current = os.path.abspath(directory)
+    parts = []
+    while not os.path.exists(os.path.join(current, '.git')):
+        parent = os.path.dirname(current)
+        if parent == current:
+            return []
+        parts.append(os.path.basename(current))
+        current = parent
+    parts.reverse()
+
+    rulesets = []
+    for i, part in enumerate(parts):
+        rules = parse_gitignore(os.path.join(current, '.gitignore'))
+        if rules:
+            rulesets.append(('/'.join(parts[i:]) + '/', 0, rules))
+        current = os.path.join(current, part)
+    return rulesets
+
+
+def iter_candidates(directory, excludes=DEFAULT_EXCLUDES, gitignore=True, skipped=None, stale=None):
+    # skipped, when given, is a dict counting entries dropped by the walk itself;
+    # stale, when given, collects staging leftovers from an interrupted run.
+    excludes = frozenset(excludes)
+    stack = [(directory, '', ancestor_gitignores(directory) if gitignore else [])]
+    while stack:
+        path, rel, rulesets = stack.pop()
+        if gitignore:
+            rules = parse_gitignore(os.path.join(path, '.gitignore'))
+            if rules:
+                rulesets = rulesets + [('', len(rel), rules)]
+        try:
+            it = os.scandir(path)
+        except OSError:
+            continue
+
+        subdirs = []
+        with it:
+            for entry in it:
+                entry_rel = rel + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in excludes:
+                        if skipped is not None:
+                            skipped['excluded_dir'] += 1
+                        continue
+                    if rulesets and is_ignored(entry_rel, True, rulesets):
+                        if skipped is not None:
+                            skipped['gitignored'] += 1
+                        continue
+                    subdirs.append((entry.path, entry_rel + '/', rulesets))
+                elif entry.name.endswith(EXTENSIONS) and entry.is_file():
+                    if rulesets and is_ignored(entry_rel, False, rulesets):
+                        if skipped is not None:
+                            skipped['gitignored'] += 1
+                        continue
+                    yield entry
+                else:
+                    if stale is not None and entry.name.endswith(STALE_SUFFIXES):
+                        stale.append(entry.path)
+                    if skipped is not None:
+                        skipped['extension'] += 1
+
+        subdirs.sort(key=lambda item: item[0], reverse=True)
+        stack.extend(subdirs)
+
+
+def load_rules(path):
+    with open(path, 'rb') as f:
+        if path.endswith('.toml'):
+            try:
+                import tomllib
+            except ImportError:  # Python < 3.11
+                raise SystemExit("TOML rules need Python 3.11+; use a JSON rules file instead")
+            data = tomllib.load(f)
+        else:
+            data = json.load(f)
+
+    # JSON may be a bare list of rules; TOML always has a top-level table.
+    rules = data.get('rules', []) if isinstance(data, dict) else data
+    if not isinstance(rules, list):
+        raise SystemExit(f"{path}: expected a list of rules or a 'rules' list")
+    mapping = {}
+    for number, rule in enumerate(rules, 1):
+        if not (isinstance(rule, dict) and isinstance(rule.get('from'), str) and isinstance(rule.get('to'), str)):
+            raise SystemExit(f"{path}: rule {number} needs 'from' and 'to'")
+        source, target = rule['from'], rule['to']
+        if mapping.get(source, target) != target:
+            raise SystemExit(f"Conflicting rules for {source!r} in {path}")
+        mapping[source] = target
+    return mapping
+
+
+def ruleset_version(mapping, mode):
+    return hashlib.sha256(json.dumps([mode, sorted(mapping.items())]).encode('utf-8')).hexdigest()
+
+
+def compile_prefilter(mapping):
+    # Byte-level needle search run over the mapped file before any decoding.
+    needles = sorted((source.encode('utf-8') for source in mapping), key=len, reverse=True)
+    return re.compile(b'|'.join(re.escape(needle) for needle in needles) or b'(?!)')
+
+
+def resolve(specifier, mapping):
+    # Exact rules win; a rule whose "from" ends in "/" also maps subpaths.
+    target = mapping.get(specifier)
+    if target is not None:
+        return target
+    end = specifier.rfind('/')
+    while end > 0:
+        prefix = specifier[:end + 1]
+        if prefix in mapping:
+            return mapping[prefix] + specifier[end + 1:]
+        end = specifier.rfind('/', 0, end)
+    return None
+
+
+def last_quoted(content, source):
+    # Offset of the last occurrence of source that opens a quoted literal the rule
+    # could rewrite: right after a quote and, unless source is a "from/" prefix,
+    # right before the same quote. Mentions in comments or longer names are skipped.
+    end = len(content)
+    while True:
+        at = content.rfind(source, 0, end)
+        if at <= 0:
+            return -1
+        quote = content[at - 1]
+        if quote in '\'"' and (source.endswith('/') or content.startswith(quote, at + len(source))):
+            return at
+        end = at + len(source) - 1
+
+
+def rewrite(content, mapping, pattern=IMPORT_TOKEN_RE):
+    # Nothing past the last quoted occurrence of a rule's "from" can change, so the
+    # scan stops there; imports sit at the top, so most of a file is never tokenized.
+    stop = max((last_quoted(content, source) for source in mapping), default=-1)
+    if stop < 0:
+        return content
+    parts = []
+    last = 0
+    for match in pattern.finditer(content):
+        if match.start() > stop:
+            break
+        specifier = match.group(2)
+        if specifier is None:
+            continue
+        target = resolve(specifier, mapping)
+        if target is None:
+            continue
+        parts.append(content[last:match.start(2)])
+        parts.append(target)
+        last = match.end(2)
+
+    if not parts:
+        return content
+    parts.append(content[last:])
+    return ''.join(parts)
+
+
+def load_manifest(path, ruleset):
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # A different rule set means every previous verdict is stale.
+    if manifest.get('format') != MANIFEST_FORMAT or manifest.get('ruleset') != ruleset:
+        return {}
+    return manifest.get('files', {})
+
+
+def save_manifest(path, ruleset, files):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'format': MANIFEST_FORMAT, 'ruleset': ruleset, 'files': files}, f,
+                  separators=(',', ':'), sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def stat_entry(st, digest):
+    # st must come from the same open file the digest was computed from, so a
+    # concurrent edit can never pair new size/mtime with an old hash.
+    # digest is None when no manifest is kept, so there is nothing to record.
+    if digest is None:
+        return None
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': digest}
+
+
+class PathEntry:
+    # Stand-in for os.DirEntry when candidates come from the import index.
+    __slots__ = ('path',)
+
+    def __init__(self, path):
+        self.path = path
+
+    def stat(self):
+        return os.stat(self.path)
+
+
+def indexed_candidates(directory, mapping, index_db=None):
+    import import_index
+
+    abs_dir = os.path.abspath(directory)
+    roots = [os.path.join(import_index.REPO_ROOT, root) for root in import_index.INDEX_ROOTS]
+    if not any(os.path.commonpath([abs_dir, root]) == root for root in roots):
+        raise SystemExit(f"--index only covers {', '.join(roots)}; {abs_dir} is outside them, "
+                         "run without --index")
+
+    conn = import_index.connect(index_db or import_index.DEFAULT_DB)
+    try:
+        import_index.update_index(conn)
+        matches = import_index.files_matching_rules(conn, mapping)
+    finally:
+        conn.close()
+
+    for rel in matches:
+        abs_path = os.path.join(import_index.REPO_ROOT, rel)
+        if abs_path.startswith(abs_dir + os.sep):
+            yield PathEntry(os.path.join(directory, os.path.relpath(abs_path, abs_dir)))
+
+
+def is_fresh(dir_entry, entry):
+    if entry is None:
+        return False
+    try:
+        st = dir_entry.stat()
+    except OSError:
+        return False
+    return st.st_size == entry['size'] and st.st_mtime_ns == entry['mtime_ns']
+
+
+class PhaseTimer:
+    # Accumulates wall time per phase between successive lap() calls.
+    __slots__ = ('timings', 'last')
+
+    def __init__(self):
+        self.timings = {}
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.timings[phase] = self.timings.get(phase, 0.0) + now - self.last
+        self.last = now
+
+
+class NullTimer:
+    __slots__ = ()
+    timings = None
+
+    def lap(self, phase):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def file_stats(timer, reason, bytes_read, bytes_written=0):
+    if timer.timings is None:
+        return None
+    return reason, bytes_read, bytes_written, timer.timings
+
+
+def stage_file(filepath, raw):
+    # Writes the new content next to the target so the final rename stays on one filesystem.
+    mode = stat.S_IMODE(os.stat(filepath).st_mode)
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(filepath) + '.', suffix=STAGE_SUFFIX,
+                                    dir=os.path.dirname(filepath) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(raw)
+            f.flush()
+            st = os.fstat(f.fileno())
+        os.chmod(tmp_path, mode)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path, st
+
+
+def unified_diff(filepath, content, new_content):
+    return ''.join(difflib.unified_diff(content.splitlines(True), new_content.splitlines(True),
+                                        fromfile='a/' + filepath, tofile='b/' + filepath))
+
+
+def process_file(mapping, prefilter, pattern, track, instrument, dry_run, task):
+    filepath, known_digest = task
+    timer = PhaseTimer() if instrument else NULL_TIMER
+    with open(filepath, 'rb') as f:
+        # Mapping only pays off for big (often generated) files; small ones are
+        # cheaper to read into a bytes buffer. Neither path decodes anything yet.
+        st = os.fstat(f.fileno())
+        size = st.st_size
+        with (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size >= MMAP_THRESHOLD
+              else contextlib.nullcontext(f.read())) as data:
+            timer.lap('read')
+            digest = hashlib.sha256(data).hexdigest() if track else None
+            timer.lap('hash')
+            # Either already processed under these rules, or no needle present:
+            # both leave the file untouched and never materialise its text.
+            if digest is not None and digest == known_digest:
+                return filepath, False, stat_entry(st, digest), file_stats(timer, 'cache_hit', size), None
+            if not prefilter.search(data):
+                timer.lap('prefilter')
+                return filepath, False, stat_entry(st, digest), file_stats(timer, 'prefilter_miss', size), None
+            timer.lap('prefilter')
+            content = str(data, 'utf-8')
+            timer.lap('decode')
+
+    new_content = rewrite(content, mapping, pattern)
+    timer.lap('rewrite')
+    if new_content == content:
+        return filepath, False, stat_entry(st, digest), file_stats(timer, 'no_change', size), None
+
+    if dry_run:
+        diff = unified_diff(filepath, content, new_content)
+        timer.lap('diff')
+        return filepath, True, None, file_stats(timer, 'updated', size), ('diff', diff)
+
+    new_raw = new_content.encode('utf-8')
+    # A symlinked file is written through the link, as a plain open() would: the
+    # rename replaces the file it points to, never the link itself.
+    target = os.path.realpath(filepath)
+    tmp_path, tmp_st = stage_file(target, new_raw)
+    timer.lap('write')
+    # The staged file keeps its mtime through the final rename, so it can seed the manifest entry.
+    return (filepath, True, stat_entry(tmp_st, hashlib.sha256(new_raw).hexdigest() if track else None),
+            file_stats(timer, 'updated', size, len(new_raw)),
+            ('staged', target, tmp_path, st.st_size, st.st_mtime_ns))
+
+
+def refactor_file(mapping, prefilter, pattern, track, instrument, dry_run, task):
+    # Errors come back as results so the caller can discard every staged file, including
+    # ones written by workers after the failing file.
+    try:
+        return process_file(mapping, prefilter, pattern, track, instrument, dry_run, task)
+    except (OSError, UnicodeDecodeError) as err:
+        return task[0], False, None, None, ('error', f"{type(err).__name__}: {err}")
+
+
+def fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_batch(paths, errors):
+    for path in paths:
+        try:
+            fsync_path(path)
+        except OSError as err:
+            errors.append(err)
+
+
+def fsync_all(paths):
+    # fsync releases the GIL, so syncing batches on a few threads hides per-file
+    # latency (notably on network filesystems).
+    errors = []
+    threads = [threading.Thread(target=fsync_batch, args=(paths[i::FSYNC_WORKERS], errors))
+               for i in range(min(FSYNC_WORKERS, len(paths)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def discard_staged(staged):
+    for _, tmp_path, _, _ in staged:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+
+
+def discard_orphans(filepaths):
+    by_folder = {}
+    for filepath in map(os.path.realpath, filepaths):
+        by_folder.setdefault(os.path.dirname(filepath) or '.', set()).add(os.path.basename(filepath))
+    for folder, names in by_folder.items():
+        with contextlib.suppress(OSError), os.scandir(folder) as it:
+            for entry in it:
+                name = entry.name
+                if (name.startswith('.') and name.endswith(STAGE_SUFFIX)
+                        and name[1:].rsplit('.', 3)[0] in names):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(entry.path)
+
+
+def clean_stale(paths):
+    # Temp files from a killed run never reached their targets and can go. Backups
+    # may be the only copy of an original if the run died mid-rename, so they are
+    # only reported.
+    for path in sorted(paths):
+        if path.endswith(STAGE_SUFFIX):
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+            print(f"Removed stale temp file: {path}", file=sys.stderr)
+        else:
+            print(f"Warning: backup left by an interrupted run, check and remove it: {path}", file=sys.stderr)
+
+
+def commit_staged(staged):
+    # staged holds (target, tmp_path, size, mtime_ns) with the target's stat when it was read;
+    # target is the resolved path, so renames and rollback never replace a symlink.
+    try:
+        fsync_all([tmp_path for _, tmp_path, _, _ in staged])
+        for target, _, size, mtime_ns in staged:
+            st = os.stat(target)
+            if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                raise RuntimeError(f"{target} changed on disk during the run")
+    except BaseException:
+        discard_staged(staged)
+        raise
+
+    backups = []
+    try:
+        for target, tmp_path, _, _ in staged:
+            backup = tmp_path + '.orig'
+            try:
+                os.link(target, backup)
+            except OSError:
+                shutil.copy2(target, backup)
+            backups.append((target, backup))
+            os.replace(tmp_path, target)
+    except BaseException:
+        for target, backup in reversed(backups):
+            os.replace(backup, target)
+            # rename() is a no-op when both names are links to one inode, i.e. the
+            # target was never replaced; drop the spare link in that case.
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(backup)
+        discard_staged(staged)
+        raise
+
+    # Every target is already replaced, so nothing below may surface as a rollback.
+    for _, backup in backups:
+        try:
+            os.unlink(backup)
+        except OSError as err:
+            print(f"Warning: could not remove backup {backup}: {err}", file=sys.stderr)
+    for folder in {os.path.dirname(target) or '.' for target, _, _, _ in staged}:
+        # Persists the renames; not every platform can open a directory.
+        with contextlib.suppress(OSError):
+            fsync_path(folder)
+
+
+def build_report(report, timer, skipped, results, top):
+    phases = dict(timer.timings)
+    # Cache hits so far are stat-fresh files that never reached refactor_file.
+    candidates = len(results) + skipped.get('cache_hit', 0)
+    bytes_read = bytes_written = 0
+    slowest = []
+    for filepath, changed, entry, stats, _ in results:
+        reason, read, written, timings = stats
+        skipped[reason] = skipped.get(reason, 0) + 1
+        bytes_read += read
+        bytes_written += written
+        for phase, seconds in timings.items():
+            # Per-file phases are summed across workers, so with --jobs they
+            # can exceed the wall-clock 'process' phase.
+            phases['file_' + phase] = phases.get('file_' + phase, 0.0) + seconds
+        slowest.append((sum(timings.values()), filepath, reason, read))
+
+    slowest.sort(reverse=True)
+    report['skipped'] = {reason: count for reason, count in skipped.items() if reason != 'updated'}
+    report['files'] = {'candidates': candidates,
+                       'updated': skipped.get('updated', 0)}
+    report['bytes'] = {'read': bytes_read, 'written': bytes_written}
+    report['phases'] = {phase: round(seconds, 6) for phase, seconds in phases.items()}
+    report['slowest'] = [{'path': filepath, 'seconds': round(seconds, 6), 'reason': reason, 'bytes': read}
+                         for seconds, filepath, reason, read in slowest[:top]]
+    report['file_events'] = [{'path': filepath, 'reason': stats[0], 'bytes_read': stats[1],
+                              'bytes_written': stats[2],
+                              'phases': {phase: round(seconds, 6) for phase, seconds in stats[3].items()}}
+                             for filepath, changed, entry, stats, _ in results]
+
+
+def refactor_framer_motion(directory, jobs=1, manifest_path=None, rules_path=DEFAULT_RULES,
+                           excludes=DEFAULT_EXCLUDES, gitignore=True, mode='imports', index=False,
+                           index_db=None, report=None, report_top=REPORT_TOP, dry_run=False):
+    # report, when given, is a dict filled with timings, byte counts, skip reasons and the slowest files.
+    instrument = report is not None
+    timer = PhaseTimer() if instrument else NULL_TIMER
+    skipped = dict.fromkeys(('extension', 'excluded_dir', 'gitignored'), 0) if instrument else None
+    index = index or index_db is not None
+    if index and mode != 'imports':
+        raise SystemExit("--index only records import specifiers; it cannot drive --mode %s" % mode)
+    mapping = load_rules(rules_path)
+    prefilter = compile_prefilter(mapping)
+    pattern = MODES[mode]
+    ruleset = ruleset_version(mapping, mode)
+    timer.lap('setup')
+    previous = load_manifest(manifest_path, ruleset)
+    track = bool(manifest_path)
+    timer.lap('manifest_load')
+    stale = []
+    if index:
+        candidates = indexed_candidates(directory, mapping, index_db)
+    else:
+        candidates = iter_candidates(directory, excludes, gitignore, skipped, stale)
+    # Manifest keys are absolute so runs over other roots or from another cwd share entries.
+    files = {}
+    tasks = []
+    for dir_entry in candidates:
+        filepath = dir_entry.path
+        key = os.path.abspath(filepath)
+        entry = previous.get(key)
+        if is_fresh(dir_entry, entry):
+            files[key] = entry
+            if instrument:
+                skipped['cache_hit'] = skipped.get('cache_hit', 0) + 1
+        else:
+            tasks.append((filepath, entry and entry['sha256']))
+    # Sorted so dry-run diffs stream in the same order as the "Updated:" lines.
+    tasks.sort()
+    timer.lap('walk')
+    if stale and not dry_run:
+        clean_stale(stale)
+
+    results = []
+    staged = []
+    errors = []
+    work = partial(refactor_file, mapping, prefilter, pattern, track, instrument, dry_run)
+    pool = None
+    try:
+        if jobs > 1:
+            # Imported lazily: the process-pool machinery costs more to import
+            # than a serial run over a typical src/ tree takes.
+            from concurrent.futures import ProcessPoolExecutor
+
+            pool = ProcessPoolExecutor(max_workers=jobs)
+            outcomes = pool.map(work, tasks, chunksize=CHUNK_SIZE)
+        else:
+            outcomes = map(work, tasks)
+        for filepath, changed, entry, stats, output in outcomes:
+            if output is not None:
+                if output[0] == 'staged':
+                    staged.append(output[1:])
+                elif output[0] == 'diff':
+                    # Printed and dropped straight away, so memory does not grow with the diff.
+                    sys.stdout.write(output[1])
+                else:
+                    errors.append(f"{filepath}: {output[1]}")
+            results.append((filepath, changed, entry, stats, None))
+    except BaseException:
+        # Interrupted or crashed mid-run: nothing has been renamed yet, so dropping
+        # the staged files leaves the tree exactly as it was. Workers may have
+        # staged files whose results never arrived; those are found on disk.
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        discard_staged(staged)
+        discard_orphans(filepath for filepath, _ in tasks[len(results):])
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    timer.lap('process')
+
+    if errors:
+        discard_staged(staged)
+        raise SystemExit("Aborted, no files were changed:\n  " + "\n  ".join(errors))
+    try:
+        commit_staged(staged)
+    except (OSError, RuntimeError) as err:
+        raise SystemExit(f"Aborted while writing, all changes rolled back: {err}")
+    timer.lap('commit')
+
+    updated = []
+    for filepath, changed, entry, stats, _ in results:
+        files[os.path.abspath(filepath)] = entry
+        if changed:
+            updated.append(filepath)
+
+    if manifest_path and not dry_run:
+        # Entries this run did not visit are kept, except ones under the target
+        # directory whose file has since been deleted.
+        prefix = os.path.join(os.path.abspath(directory), '')
+        for key, entry in previous.items():
+            if key not in files and (not key.startswith(prefix) or os.path.exists(key)):
+                files[key] = entry
+        save_manifest(manifest_path, ruleset, files)
+    timer.lap('manifest_save')
+
+    updated.sort()
+    if dry_run:
+        print(f"Total files that would be updated: {len(updated)}", file=sys.stderr)
+    else:
+        for filepath in updated:
+            print(f"Updated: {filepath}")
+        print(f"Total files updated: {len(updated)}")
+    if instrument:
+        timer.lap('output')
+        report.update(directory=directory, rules=rules_path, mode=mode, jobs=jobs, index=index,
+                      manifest=manifest_path, dry_run=dry_run)
+        build_report(report, timer, skipped, results, report_top)
+        report['phases']['total'] = round(sum(timer.timings.values()), 6)
+    return updated
+
+
+def write_report(path, report):
+    events = report.pop('file_events')
+    if path.endswith('.jsonl'):
+        # Appended, so batch runs over many repos can share one log.
+        with open(path, 'a', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps({'event': 'file', 'directory': report['directory'], **event}) + '\n')
+            f.write(json.dumps({'event': 'summary', **report}) + '\n')
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+
+
+def run_profiled(profiler, top, func, *args, **kwargs):
+    # Only the parent process is profiled; use --jobs 1 to see the per-file work.
+    if profiler == 'cprofile':
+        import cProfile
+        import pstats
+
+        profile = cProfile.Profile()
+        result = profile.runcall(func, *args, **kwargs)
+        stats = pstats.Stats(profile, stream=sys.stderr).sort_stats('cumulative')
+        stats.print_stats(top)
+        hot = [{'function': f"{filename}:{line}({name})", 'calls': calls, 'tottime': round(tottime, 6),
+                'cumtime': round(cumtime, 6)}
+               for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items()]
+        hot.sort(key=lambda row: row['cumtime'], reverse=True)
+        return result, {'profiler': 'cprofile', 'top': hot[:top]}
+
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        result = func(*args, **kwargs)
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    sites = snapshot.statistics('lineno')[:top]
+    print(f"tracemalloc: peak {peak} bytes; top {len(sites)} allocation sites", file=sys.stderr)
+    for site in sites:
+        print(f"  {site}", file=sys.stderr)
+    return result, {'profiler': 'tracemalloc', 'peak_bytes': peak,
+                    'top': [{'site': str(site.traceback), 'bytes': site.size, 'count': site.count}
+                            for site in sites]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite module specifiers (framer-motion -> motion/react by default).")
+    parser.add_argument('directory', nargs='?', default=DEFAULT_DIRECTORY)
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="worker processes used to scan and rewrite files (default: 1, serial)")
+    parser.add_argument('--manifest', metavar='PATH',
+                        help="JSON manifest of already-processed files; unchanged files are skipped on later runs")
+    parser.add_argument('--rules', metavar='PATH', default=DEFAULT_RULES,
+                        help="JSON or TOML file with [{from, to}] specifier rules, as a bare list or under "
+                             "'rules' (default: %(default)s)")
+    parser.add_argument('--exclude', metavar='NAME', action='append', default=[],
+                        help="directory name to skip, in addition to %s (repeatable)" % ', '.join(DEFAULT_EXCLUDES))
+    parser.add_argument('--no-gitignore', dest='gitignore', action='store_false',
+                        help="do not honour .gitignore files")
+    parser.add_argument('--mode', choices=sorted(MODES), default='imports',
+                        help="'imports' rewrites only module specifiers; 'literals' rewrites every matching "
+                             "quoted string (default: %(default)s)")
+    parser.add_argument('--index', action='store_true',
+                        help="visit only files that import_index.py reports as importing a rule's specifier")
+    parser.add_argument('--index-db', metavar='PATH',
+                        help="import index to use (implies --index; default: import_index.py's default)")
+    parser.add_argument('--report', metavar='PATH',
+                        help="write a run report: JSON, or JSONL (one event per file plus a summary, appended) "
+                             "when PATH ends in .jsonl")
+    parser.add_argument('--report-top', metavar='N', type=int, default=REPORT_TOP,
+                        help="slowest files / profile rows to include (default: %(default)s)")
+    parser.add_argument('--profile', choices=('cprofile', 'tracemalloc'),
+                        help="run under a profiler and print the top functions or allocation sites to stderr")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="print unified diffs to stdout instead of writing any file")
+    args = parser.parse_args()
+
+    report = {} if args.report else None
+    kwargs = dict(jobs=max(1, args.jobs), manifest_path=args.manifest, rules_path=args.rules,
+                  excludes=DEFAULT_EXCLUDES + tuple(args.exclude), gitignore=args.gitignore, mode=args.mode,
+                  index=args.index, index_db=args.index_db, report=report, report_top=args.report_top,
+                  dry_run=args.dry_run)
+    if args.profile:
+        _, profile = run_profiled(args.profile, args.report_top, refactor_framer_motion, args.directory, **kwargs)
+        if report is not None:
+            report['profile'] = profile
+    else:
+        refactor_framer_motion(args.directory, **kwargs)
+
+    if report is not None:
+        write_report(args.report, report)
+
 
 if __name__ == '__main__':
-    refactor_framer_motion('/Users/Naegele/dev/brain/src')
+    main()
@@ -0,0 +1,197 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+import refactor_motion
+
+
+def touch(root, rel, content=''):
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+
+class RewriteTest(unittest.TestCase):
+    MAPPING = {'framer-motion': 'motion/react', 'framer-motion/': 'motion/react/', 'old-lib': 'new-lib'}
+
+    def rewrite(self, content, mode='imports'):
+        return refactor_motion.rewrite(content, self.MAPPING, refactor_motion.MODES[mode])
+
+    def test_import_positions(self):
+        cases = [
+            ("import { motion } from 'framer-motion';", "import { motion } from 'motion/react';"),
+            ('import "framer-motion";', 'import "motion/react";'),
+            ("export * from 'framer-motion';", "export * from 'motion/react';"),
+            ("const m = await import('framer-motion');", "const m = await import('motion/react');"),
+            ("const m = require ( 'framer-motion' );", "const m = require ( 'motion/react' );"),
+            ("vi.mock('framer-motion', () => ({}));", "vi.mock('motion/react', () => ({}));"),
+            ("jest.requireActual('framer-motion');", "jest.requireActual('motion/react');"),
+            ("type T = typeof import('old-lib');", "type T = typeof import('new-lib');"),
+        ]
+        for content, expected in cases:
+            with self.subTest(content=content):
+                self.assertEqual(self.rewrite(content), expected)
+
+    def test_subpath_rules(self):
+        self.assertEqual(self.rewrite("import x from 'framer-motion/dom';"), "import x from 'motion/react/dom';")
+        self.assertEqual(self.rewrite("import x from 'framer-motion-extra';"), "import x from 'framer-motion-extra';")
+        self.assertEqual(self.rewrite("import x from 'old-lib/sub';"), "import x from 'old-lib/sub';")
+
+    def test_skips_comments_strings_and_templates(self):
+        content = '\n'.join([
+            "// import x from 'framer-motion';",
+            "/* require('framer-motion') */",
+            "const s = `import('framer-motion') ${'framer-motion'}`;",
+            "const t = \"from 'framer-motion'\";",
+            "const u = 'framer-motion';",
+            "notvi.mock('framer-motion');",
+            "myimport('framer-motion');",
+            "import a from 'framer-motion';",
+        ])
+        expected = content.rsplit('\n', 1)[0] + "\nimport a from 'motion/react';"
+        self.assertEqual(self.rewrite(content), expected)
+
+    def test_scan_stops_after_last_quoted_occurrence(self):
+        # The trailing unquoted mention must not stop the earlier import from being rewritten.
+        content = "import a from 'framer-motion';\nconst note = framer-motion;\n// framer-motion\n"
+        self.assertEqual(self.rewrite(content), content.replace("'framer-motion'", "'motion/react'"))
+        comment_only = "// framer-motion\n"
+        self.assertIs(self.rewrite(comment_only), comment_only)
+
+    def test_literals_mode(self):
+        self.assertEqual(self.rewrite("const u = 'framer-motion';", 'literals'), "const u = 'motion/react';")
+
+
+class GitignoreTest(unittest.TestCase):
+    GITIGNORE = '\n'.join([
+        '# comment',
+        '*.gen.ts',
+        '!keep.gen.ts',
+        '[a!b].ts',
+        '[!x]y.ts',
+        '[]]br.ts',
+        r'\#hash.ts',
+        r'\!bang.ts',
+        'build/',
+        '/rooted.ts',
+        'docs/**/*.ts',
+        'trail.ts   ',
+    ]) + '\n'
+    FILES = ('a.gen.ts', 'keep.gen.ts', 'sub/x.gen.ts', 'sub/keep.gen.ts', 'a.ts', '!.ts', 'b.ts', 'c.ts',
+             'zy.ts', 'xy.ts', 'sub/zy.ts', ']br.ts', '#hash.ts', '!bang.ts', 'bang.ts', 'build/q.ts',
+             'sub/build/q.ts', 'rooted.ts', 'sub/rooted.ts', 'docs/d.ts', 'docs/a/b/d.ts', 'trail.ts')
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        touch(self.root, '.gitignore', self.GITIGNORE)
+        for rel in self.FILES:
+            touch(self.root, rel)
+
+    def walked(self, directory=None):
+        directory = directory or self.root
+        return sorted(os.path.relpath(entry.path, self.root).replace(os.sep, '/')
+                      for entry in refactor_motion.iter_candidates(directory))
+
+    def test_negation_anchoring_classes_and_escapes(self):
+        self.assertEqual(self.walked(), ['bang.ts', 'c.ts', 'keep.gen.ts', 'sub/keep.gen.ts', 'sub/rooted.ts', 'xy.ts'])
+
+    def test_nested_gitignore_and_ancestors(self):
+        touch(self.root, 'sub/.gitignore', '!x.gen.ts\nrooted.ts\n')
+        os.mkdir(os.path.join(self.root, '.git'))
+        # Walking from sub/ still applies the root .gitignore above it.
+        self.assertEqual(self.walked(os.path.join(self.root, 'sub')), ['sub/keep.gen.ts', 'sub/x.gen.ts'])
+
+    @unittest.skipUnless(shutil.which('git'), "git is not installed")
+    def test_matches_git_check_ignore(self):
+        subprocess.run(['git', 'init', '-q', self.root], check=True)
+        listed = subprocess.run(['git', 'ls-files', '--others', '--exclude-standard', '-z'], cwd=self.root,
+                                check=True, capture_output=True, text=True).stdout
+        expected = sorted(path for path in listed.split('\0') if path.endswith(refactor_motion.EXTENSIONS))
+        self.assertEqual(self.walked(), expected)
+
+    def test_glob_to_regex(self):
+        cases = [
+            ('[a!b]', '!', True), ('[a!b]', 'c', False),
+            ('[!x]', 'y', True), ('[!x]', 'x', False), ('[!x]', '/', False),
+            ('[^x]', 'y', True), ('[]]', ']', True), (r'[\]]', ']', True),
+            ('[a-c]', 'b', True), ('[a-c]', '-', False), ('[', '[', True),
+            (r'\#a', '#a', True), (r'\!a', '!a', True), (r'\*', '*', True), (r'\*', 'x', False),
+            ('a/**/b', 'a/b', True), ('a/**/b', 'a/x/y/b', True), ('*', 'a/b', False),
+        ]
+        for pattern, path, matches in cases:
+            with self.subTest(pattern=pattern, path=path):
+                self.assertEqual(bool(refactor_motion.re.fullmatch(refactor_motion.glob_to_regex(pattern), path)),
+                                 matches)
+
+
+class CommitStagedTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.targets = [touch(self.root, f'{name}.ts', f'old {name}') for name in 'abc']
+
+    def stage(self):
+        staged = []
+        for target in self.targets:
+            st = os.stat(target)
+            tmp_path, _ = refactor_motion.stage_file(target, b'new ' + os.path.basename(target).encode())
+            staged.append((target, tmp_path, st.st_size, st.st_mtime_ns))
+        return staged
+
+    def contents(self):
+        contents = {}
+        for name in sorted(os.listdir(self.root)):
+            with open(os.path.join(self.root, name), encoding='utf-8') as f:
+                contents[name] = f.read()
+        return contents
+
+    def test_commits_every_file(self):
+        refactor_motion.commit_staged(self.stage())
+        self.assertEqual(self.contents(), {'a.ts': 'new a.ts', 'b.ts': 'new b.ts', 'c.ts': 'new c.ts'})
+
+    def test_rolls_back_when_a_rename_fails_mid_batch(self):
+        staged = self.stage()
+        replace = os.replace
+        calls = []
+
+        def failing_replace(src, dst):
+            calls.append(src)
+            if len(calls) == 2:
+                raise OSError("rename failed")
+            replace(src, dst)
+
+        with mock.patch.object(refactor_motion.os, 'replace', failing_replace), self.assertRaises(OSError):
+            refactor_motion.commit_staged(staged)
+        # The first target was replaced and then restored; no temp file or backup is left.
+        self.assertEqual(self.contents(), {'a.ts': 'old a', 'b.ts': 'old b', 'c.ts': 'old c'})
+
+    def test_refuses_targets_changed_during_the_run(self):
+        staged = self.stage()
+        with open(self.targets[1], 'a', encoding='utf-8') as f:
+            f.write(' edited')
+        with self.assertRaises(RuntimeError):
+            refactor_motion.commit_staged(staged)
+        self.assertEqual(self.contents(), {'a.ts': 'old a', 'b.ts': 'old b edited', 'c.ts': 'old c'})
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), "symlinks are not supported")
+    def test_writes_through_symlinks(self):
+        link = os.path.join(self.root, 'link.ts')
+        os.symlink(self.targets[0], link)
+        with open(self.targets[0], 'w', encoding='utf-8') as f:
+            f.write("import { motion } from 'framer-motion';")
+        mapping = {'framer-motion': 'motion/react'}
+        result = refactor_motion.process_file(mapping, refactor_motion.compile_prefilter(mapping),
+                                              refactor_motion.IMPORT_TOKEN_RE, False, False, False, (link, None))
+        refactor_motion.commit_staged([result[4][1:]])
+        self.assertTrue(os.path.islink(link))
+        self.assertEqual(self.contents()['a.ts'], "import { motion } from 'motion/react';")
+
+
+if __name__ == '__main__':
+    unittest.main()